@@ -1,22 +1,17 @@
 import os
-import re
-import requests
 import logging
 import ssl
-from typing import TypedDict, List
+import orjson
 
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from redis import Redis
 from rq import Queue
-from rq.job import Job
+from rq.job import Job, JobStatus
 
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage
-
-from tasks import analyze_pr_task
+from results import RESULT_TTL, result_key
 
 # --- Logging setup ---
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +23,8 @@ if not openai_api_key or not openai_api_key.startswith("sk-"):
     raise ValueError("Invalid or missing OPENAI_API_KEY")
 
 # --- Flask ---
+# Run with `gunicorn --preload` (workers from WEB_CONCURRENCY / -w) so modules load
+# once in the master and are shared copy-on-write by the forked workers.
 app = Flask(__name__)
 CORS(app)
 
@@ -39,28 +36,40 @@ redis_conn = Redis.from_url(
 )
 task_queue = Queue(connection=redis_conn)
 
+def json_response(payload, status=200):
+    # orjson is much faster than the stdlib encoder on large analysis results.
+    return app.response_class(orjson.dumps(payload), status=status, mimetype="application/json")
+
 # --- Routes ---
 @app.route("/analyze_pr", methods=["POST"])
 def analyze_pr():
     data = request.get_json()
     if not data or "pr_url" not in data:
-        return jsonify({"error": "Missing 'pr_url' in request body"}), 400
+        return json_response({"error": "Missing 'pr_url' in request body"}, 400)
 
-    job = task_queue.enqueue(analyze_pr_task, data["pr_url"])
-    return jsonify({"job_id": job.get_id()}), 202
+    # Enqueued by import path so the web process never loads LangChain or the graph.
+    job = task_queue.enqueue("tasks.analyze_pr_task", data["pr_url"], result_ttl=RESULT_TTL)
+    return json_response({"job_id": job.get_id()}, 202)
 
 @app.route("/job_status/<job_id>", methods=["GET"])
 def job_status(job_id):
     try:
-        job = Job.fetch(job_id, connection=redis_conn)
-        if job.is_finished:
-            return jsonify({"status": "finished", "result": job.result})
-        elif job.is_failed:
-            return jsonify({"status": "failed", "error": job.exc_info})
+        # Only the status field is read while polling; the job and its result are not deserialized.
+        status = Job(job_id, connection=redis_conn).get_status()
+        if status == JobStatus.FINISHED:
+            result = redis_conn.get(result_key(job_id))
+            if result is None:
+                return json_response({"error": "Result expired"}, 404)
+            body = b'{"status":"finished","result":' + result + b'}'
+            return app.response_class(body, mimetype="application/json")
+        elif status == JobStatus.FAILED:
+            job = Job.fetch(job_id, connection=redis_conn)
+            latest = job.latest_result()
+            return json_response({"status": "failed", "error": latest.exc_string if latest else None})
         else:
-            return jsonify({"status": "in_progress"})
+            return json_response({"status": "in_progress"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 404
+        return json_response({"error": str(e)}, 404)
 
 @app.route('/')
 def hello_world():
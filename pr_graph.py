@@ -0,0 +1,482 @@
+import os
+import re
+import ssl
+import json
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TypedDict, List, Optional, Tuple, AsyncIterable, AsyncIterator
+
+import httpx
+import orjson
+from dotenv import load_dotenv
+from redis import Redis
+from langgraph.graph import StateGraph, END
+from langchain_openai import ChatOpenAI
+from langchain.schema import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+from prompts import BATCH_SYSTEM_PROMPT, DEV_SUMMARY_SYSTEM_PROMPT, BUSINESS_SUMMARY_SYSTEM_PROMPT
+load_dotenv()
+openai_api_key = os.getenv("OPENAI_API_KEY")
+
+REVIEW_MODEL = os.getenv("REVIEW_MODEL", "gpt-4o")
+
+# Upper bound on in-flight OpenAI requests; tune to the account's RPM tier.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+# Files are analysed several per request; a batch closes at whichever limit is hit first.
+BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))
+BATCH_MAX_CHARS = int(os.getenv("LLM_BATCH_MAX_CHARS", "48000"))
+# temperature=0 makes responses repeatable, so identical prompts are served from Redis.
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+# Input is truncated and output capped so one huge file cannot dominate prefill or decode time.
+DIFF_MAX_CHARS = int(os.getenv("DIFF_MAX_CHARS", "12000"))
+FILE_MAX_TOKENS = int(os.getenv("FILE_MAX_TOKENS", "600"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "500"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "48000"))
+# Parsed diffs are kept with their GitHub ETag so unchanged PRs are revalidated, not re-downloaded.
+DIFF_CACHE_TTL = int(os.getenv("DIFF_CACHE_TTL", "86400"))
+
+# Files below this many changed lines, whitespace-only edits, pure renames and
+# generated/non-code files get a canned summary instead of an LLM call.
+TRIVIAL_LINE_THRESHOLD = int(os.getenv("TRIVIAL_LINE_THRESHOLD", "5"))
+SKIPPED_SUFFIXES = (
+    ".lock", "package-lock.json", ".min.js", ".min.css", ".map", ".svg", ".png", ".jpg", ".gif", ".ico", ".snap",
+)
+# Leading indentation is meaningful in these files, so re-indenting is not a whitespace-only edit.
+INDENT_SENSITIVE_SUFFIXES = (".py", ".yaml", ".yml", "Makefile", ".mk")
+
+APEX_SUFFIXES = (".cls", ".trigger")
+
+DIFF_HEADER = "diff --git "
+FILE_HEADER_RE = re.compile(r'a/(.*?) b/')
+
+# Redis cache round-trips are blocking; run them on a small thread pool so
+# concurrent batch calls do not serialize on the event loop.
+io_executor = ThreadPoolExecutor(max_workers=16)
+
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+redis_conn = Redis.from_url(
+    redis_url,
+    ssl_cert_reqs=ssl.CERT_NONE if redis_url.startswith("rediss://") else None
+)
+
+@dataclass(slots=True)
+class FileColumns:
+    # Per-file data stored column-wise; index i in every list refers to the same file.
+    filenames: List[str] = field(default_factory=list)
+    diffs: List[str] = field(default_factory=list)
+    is_apex: List[bool] = field(default_factory=list)
+    explanations: List[str] = field(default_factory=list)
+    review_comments: List[str] = field(default_factory=list)
+    business_summaries: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def add(self, filename: str, diff: str) -> None:
+        self.filenames.append(filename)
+        self.diffs.append(diff)
+        self.is_apex.append(is_apex_file(filename))
+        self.explanations.append("")
+        self.review_comments.append("")
+        self.business_summaries.append("")
+
+    def set_result(self, idx: int, explanation: str, review_comments: str, business_summary: str) -> None:
+        self.explanations[idx] = explanation
+        self.review_comments[idx] = review_comments
+        self.business_summaries[idx] = business_summary
+
+    def rows(self) -> List[dict]:
+        return [
+            {
+                "filename": filename,
+                "diff": diff,
+                "is_apex": is_apex,
+                "explanation": explanation,
+                "review_comments": review_comments,
+                "business_summary": business_summary,
+            }
+            for filename, diff, is_apex, explanation, review_comments, business_summary in zip(
+                self.filenames, self.diffs, self.is_apex,
+                self.explanations, self.review_comments, self.business_summaries,
+            )
+        ]
+
+@dataclass(slots=True)
+class Clients:
+    # Per-file analysis runs on the small model; Apex reviews use REVIEW_MODEL and the
+    # cross-file aggregation keeps the larger model. All share one pooled HTTP/2 client.
+    http: httpx.AsyncClient
+    llm_fast: ChatOpenAI
+    llm_review: ChatOpenAI
+    llm: ChatOpenAI
+
+def make_clients(http_client: httpx.AsyncClient) -> Clients:
+    def chat(model: str) -> ChatOpenAI:
+        return ChatOpenAI(model=model, temperature=0, openai_api_key=openai_api_key, http_async_client=http_client)
+    return Clients(http_client, chat("gpt-4o-mini"), chat(REVIEW_MODEL), chat("gpt-4o"))
+
+class PRState(TypedDict):
+    pr_url: str
+    files: FileColumns
+    dev_summary: str
+    business_summary: str
+
+def log_cache_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None) or {}
+    cached = usage.get("input_token_details", {}).get("cache_read", 0)
+    logging.info(f"OpenAI prompt tokens: {usage.get('input_tokens', 0)}, cached: {cached}")
+
+def llm_cache_key(model: ChatOpenAI, system: str, prompt: str, max_tokens: int, response_format: str = "text") -> str:
+    digest = hashlib.sha256(f"{model.model_name}|{response_format}|{max_tokens}|{system}|{prompt}".encode()).hexdigest()
+    return "llm:" + digest
+
+def cache_get(key: str) -> Optional[str]:
+    try:
+        cached = redis_conn.get(key)
+    except Exception as e:
+        logging.warning(f"LLM cache lookup failed: {e}")
+        return None
+    return cached.decode() if cached is not None else None
+
+def cache_set(key: str, value: str) -> None:
+    try:
+        redis_conn.setex(key, LLM_CACHE_TTL, value)
+    except Exception as e:
+        logging.warning(f"LLM cache store failed: {e}")
+
+async def run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+def truncate(text: str, max_chars: int) -> str:
+    # Keep the head (file header, first hunks) and the tail, dropping whole lines from the middle.
+    if len(text) <= max_chars:
+        return text
+    head = text[:int(max_chars * 0.6)].rsplit("\n", 1)[0]
+    tail = text[-int(max_chars * 0.4):].split("\n", 1)[-1]
+    dropped = text.count("\n", len(head), len(text) - len(tail)) - 1
+    if dropped > 0:
+        return f"{head}\n…[truncated {dropped} lines]…\n{tail}"
+    # No whole line was dropped (e.g. a single minified line), so report characters instead.
+    head, tail = text[:int(max_chars * 0.6)], text[-int(max_chars * 0.4):]
+    return f"{head}\n…[truncated {len(text) - len(head) - len(tail)} chars]…\n{tail}"
+
+def join_sections(sections: List[str], max_chars: int) -> str:
+    # Keep whole per-file sections in order and say how many were left out, rather than cutting mid-file.
+    kept: List[str] = []
+    size = 0
+    for section in sections:
+        if kept and size + len(section) + 2 > max_chars:
+            break
+        kept.append(truncate(section, max_chars) if not kept else section)
+        size += len(kept[-1]) + 2
+    omitted = len(sections) - len(kept)
+    if omitted:
+        kept.append(f"…[{omitted} more file(s) omitted]…")
+    return "\n\n".join(kept)
+
+async def call_llm_safe(model: ChatOpenAI, system: str, prompt: str, semaphore: asyncio.Semaphore) -> str:
+    key = llm_cache_key(model, system, prompt, SUMMARY_MAX_TOKENS)
+    cached = await run_blocking(cache_get, key)
+    if cached is not None:
+        return cached
+    try:
+        async with semaphore:
+            response = await model.ainvoke(
+                [SystemMessage(content=system), HumanMessage(content=prompt)],
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+        log_cache_usage(response)
+        result = response.content.strip()
+        await run_blocking(cache_set, key, result)
+        return result
+    except Exception as e:
+        logging.error(f"OpenAI call failed: {e}")
+        return f"Error: {str(e)}"
+
+def covers_batch(result: dict, indices: List[int]) -> bool:
+    items = result.get("files") if isinstance(result, dict) else None
+    if not isinstance(items, list):
+        return False
+    returned = {item.get("idx") for item in items if isinstance(item, dict)}
+    return returned.issuperset(indices)
+
+async def call_llm_json(model: ChatOpenAI, system: str, prompt: str, indices: List[int], max_tokens: int, semaphore: asyncio.Semaphore) -> dict:
+    key = llm_cache_key(model, system, prompt, max_tokens, "json_object")
+    cached = await run_blocking(cache_get, key)
+    if cached is not None:
+        return json.loads(cached)
+    try:
+        async with semaphore:
+            response = await model.ainvoke(
+                [SystemMessage(content=system), HumanMessage(content=prompt)],
+                response_format={"type": "json_object"},
+                max_tokens=max_tokens,
+            )
+        log_cache_usage(response)
+        if response.response_metadata.get("finish_reason") == "length":
+            logging.warning(f"Batch response for files {indices} hit max_tokens={max_tokens}")
+            return {"error": f"Error: response cut off at max_tokens={max_tokens}", "truncated": True}
+        result = json.loads(response.content)
+        if not isinstance(result, dict):
+            raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+        # Partial answers are returned but not cached, so a re-run can fill in the missing files.
+        if covers_batch(result, indices):
+            await run_blocking(cache_set, key, response.content)
+        else:
+            logging.warning(f"Batch response did not cover files {indices}; not caching")
+        return result
+    except Exception as e:
+        logging.error(f"OpenAI batch call failed: {e}")
+        return {"error": f"Error: {str(e)}"}
+
+def is_apex_file(filename: str) -> bool:
+    return filename.endswith(APEX_SUFFIXES)
+
+async def iter_lines(chunks: AsyncIterable[str]) -> AsyncIterator[str]:
+    # The unfinished line is kept as parts and joined once, so a multi-MB line is not re-copied per chunk.
+    pending: List[str] = []
+    async for chunk in chunks:
+        if "\n" not in chunk:
+            pending.append(chunk)
+            continue
+        lines = chunk.split("\n")
+        pending.append(lines[0])
+        yield "".join(pending)
+        for line in lines[1:-1]:
+            yield line
+        pending = [lines[-1]]
+    tail = "".join(pending)
+    if tail:
+        yield tail
+
+async def iter_files(lines: AsyncIterable[str]) -> AsyncIterator[Tuple[str, str]]:
+    def make_file(header: str, body: List[str]) -> Optional[Tuple[str, str]]:
+        match = FILE_HEADER_RE.match(header, len(DIFF_HEADER))
+        if not match:
+            return None
+        return match.group(1).strip(), "\n".join(body).strip()
+
+    header = None
+    body: List[str] = []
+    async for line in lines:
+        if line.startswith(DIFF_HEADER):
+            file = make_file(header, body) if header is not None else None
+            if file:
+                yield file
+            header, body = line, []
+        elif header is not None:
+            body.append(line)
+    file = make_file(header, body) if header is not None else None
+    if file:
+        yield file
+
+def diff_cache_get(key: str) -> dict:
+    try:
+        return redis_conn.hgetall(key)
+    except Exception as e:
+        logging.warning(f"Diff cache lookup failed: {e}")
+        return {}
+
+def diff_cache_set(key: str, etag: str, files: FileColumns) -> None:
+    payload = orjson.dumps({"filenames": files.filenames, "diffs": files.diffs})
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.hset(key, mapping={"etag": etag, "files": payload})
+        pipe.expire(key, DIFF_CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Diff cache store failed: {e}")
+
+async def fetch_pr_diff(state: PRState, config: RunnableConfig) -> dict:
+    http_client = config["configurable"]["clients"].http
+    cache_key = f"diff:{state['pr_url']}"
+    cached = await run_blocking(diff_cache_get, cache_key)
+    headers = {"If-None-Match": cached[b"etag"].decode()} if b"etag" in cached and b"files" in cached else {}
+
+    files = FileColumns()
+    # Stream the diff and split it into files as lines arrive, so the whole body is never held at once.
+    async with http_client.stream("GET", state["pr_url"] + ".diff", headers=headers) as response:
+        if response.status_code == 304 and headers:
+            cached_files = orjson.loads(cached[b"files"])
+            for filename, diff in zip(cached_files["filenames"], cached_files["diffs"]):
+                files.add(filename, diff)
+            return {"files": files}
+        # Fail the job on 404/429/5xx instead of splitting an error page into zero files.
+        response.raise_for_status()
+        async for filename, diff in iter_files(iter_lines(response.aiter_text())):
+            files.add(filename, diff)
+        etag = response.headers.get("ETag")
+
+    if response.status_code == 200 and etag:
+        await run_blocking(diff_cache_set, cache_key, etag, files)
+    return {"files": files}
+
+def normalize_whitespace(lines: List[str], keep_indent: bool) -> List[str]:
+    # Runs of whitespace collapse to one space (never removed outright) and blank lines are dropped.
+    normalized = []
+    for line in lines:
+        collapsed = " ".join(line.split())
+        if not collapsed:
+            continue
+        if keep_indent:
+            collapsed = line[:len(line) - len(line.lstrip())] + collapsed
+        normalized.append(collapsed)
+    return normalized
+
+def trivial_summary(filename: str, diff: str, is_apex: bool) -> Optional[str]:
+    if filename.endswith(SKIPPED_SUFFIXES):
+        return "Generated or non-code file; not analyzed."
+    added, removed = [], []
+    has_hunks = False
+    for line in diff.split("\n"):
+        # ---/+++ are file headers only before the first hunk; inside a hunk they are content.
+        if not has_hunks and (line.startswith("+++") or line.startswith("---")):
+            continue
+        if line.startswith("@@"):
+            has_hunks = True
+        elif line.startswith("+"):
+            added.append(line[1:])
+        elif line.startswith("-"):
+            removed.append(line[1:])
+    if not has_hunks:
+        if "rename from " in diff:
+            return "File renamed without content changes."
+        return "No textual changes (mode change or binary file)."
+    # Compare line by line, in order, so moved lines are not mistaken for whitespace edits.
+    keep_indent = filename.endswith(INDENT_SENSITIVE_SUFFIXES)
+    if normalize_whitespace(added, keep_indent) == normalize_whitespace(removed, keep_indent):
+        return "Whitespace-only change."
+    changed = len(added) + len(removed)
+    # Apex files are always reviewed, however small the change.
+    if changed < TRIVIAL_LINE_THRESHOLD and not is_apex:
+        return f"Trivial change ({changed} lines)."
+    return None
+
+def make_batches(files: FileColumns, candidates: List[int]) -> List[List[int]]:
+    # Apex and non-Apex files are batched separately so only Apex batches go to the review model.
+    batches: List[List[int]] = []
+    for is_apex in (False, True):
+        current: List[int] = []
+        current_chars = 0
+        for idx in candidates:
+            if files.is_apex[idx] != is_apex:
+                continue
+            size = min(len(files.diffs[idx]), DIFF_MAX_CHARS)
+            if current and (len(current) >= BATCH_SIZE or current_chars + size > BATCH_MAX_CHARS):
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append(idx)
+            current_chars += size
+        if current:
+            batches.append(current)
+    return batches
+
+def build_batch_prompt(files: FileColumns, indices: List[int]) -> str:
+    parts = []
+    for idx in indices:
+        label = " (Apex)" if files.is_apex[idx] else ""
+        parts.append(f"### File {idx}: {files.filenames[idx]}{label}\n{truncate(files.diffs[idx], DIFF_MAX_CHARS)}")
+    return "\n\n".join(parts)
+
+async def analyze_batch(clients: Clients, files: FileColumns, indices: List[int], semaphore: asyncio.Semaphore) -> dict:
+    response = await call_llm_json(
+        clients.llm_review if files.is_apex[indices[0]] else clients.llm_fast,
+        BATCH_SYSTEM_PROMPT,
+        build_batch_prompt(files, indices),
+        indices,
+        FILE_MAX_TOKENS * len(indices),
+        semaphore,
+    )
+    if not response.get("truncated") or len(indices) == 1:
+        return response
+    # The answer ran out of output tokens; retry each half so every file gets its own budget share.
+    middle = len(indices) // 2
+    halves = await asyncio.gather(
+        analyze_batch(clients, files, indices[:middle], semaphore),
+        analyze_batch(clients, files, indices[middle:], semaphore),
+    )
+    merged = [item for half in halves if isinstance(half.get("files"), list) for item in half["files"]]
+    errors = [half["error"] for half in halves if "error" in half]
+    return {"files": merged, **({"error": errors[0]} if errors else {})}
+
+async def process_files(state: PRState, config: RunnableConfig) -> dict:
+    # Results are written into the FileColumns slots in place; the node only reports which key changed.
+    clients = config["configurable"]["clients"]
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    files = state["files"]
+    candidates = []
+    for idx, (filename, diff, is_apex) in enumerate(zip(files.filenames, files.diffs, files.is_apex)):
+        summary = trivial_summary(filename, diff, is_apex)
+        if summary is None:
+            candidates.append(idx)
+        else:
+            files.set_result(idx, summary, "", "Minor file change.")
+
+    batches = make_batches(files, candidates)
+    responses = await asyncio.gather(*(analyze_batch(clients, files, indices, semaphore) for indices in batches))
+
+    for indices, response in zip(batches, responses):
+        error = response.get("error", "Error: file missing from batch response")
+        results = {}
+        # JSON mode guarantees an object, not the schema; anything but a list leaves every file on the error path.
+        items = response.get("files")
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and isinstance(item.get("idx"), int):
+                results[item["idx"]] = item
+        for idx in indices:
+            item = results.get(idx)
+            if item is None:
+                files.set_result(idx, error, "", error)
+                continue
+            files.set_result(
+                idx,
+                str(item.get("explanation", "")).strip(),
+                str(item.get("review", "")).strip() if files.is_apex[idx] else "",
+                str(item.get("business", "")).strip(),
+            )
+    return {"files": files}
+
+async def aggregate_summaries(state: PRState, config: RunnableConfig) -> dict:
+    llm = config["configurable"]["clients"].llm
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    files = state["files"]
+    explanations = join_sections(
+        [f"Changes in {filename}:\n{explanation}" for filename, explanation in zip(files.filenames, files.explanations)],
+        SUMMARY_MAX_CHARS,
+    )
+    business_summaries = join_sections(files.business_summaries, SUMMARY_MAX_CHARS)
+    dev_summary, business_summary = await asyncio.gather(
+        call_llm_safe(llm, DEV_SUMMARY_SYSTEM_PROMPT, explanations, semaphore),
+        call_llm_safe(llm, BUSINESS_SUMMARY_SYSTEM_PROMPT, business_summaries, semaphore),
+    )
+    return {"dev_summary": dev_summary, "business_summary": business_summary}
+
+# Build graph
+builder = StateGraph(PRState)
+builder.add_node("fetch_diff", fetch_pr_diff)
+builder.add_node("process_files", process_files)
+builder.add_node("aggregate_summaries", aggregate_summaries)
+builder.set_entry_point("fetch_diff")
+builder.add_edge("fetch_diff", "process_files")
+builder.add_edge("process_files", "aggregate_summaries")
+builder.add_edge("aggregate_summaries", END)
+graph = builder.compile()
+
+async def run_graph(pr_url: str) -> PRState:
+    # httpx connections are bound to the event loop that opened them and analyze() starts a
+    # new loop per call, so each run builds its own clients and closes them when it ends.
+    async with httpx.AsyncClient(http2=True, timeout=30, follow_redirects=True, headers={"Accept-Encoding": "gzip"}) as http_client:
+        clients = make_clients(http_client)
+        return await graph.ainvoke({"pr_url": pr_url}, config={"configurable": {"clients": clients}})
+
+def analyze(pr_url: str) -> dict:
+    result = asyncio.run(run_graph(pr_url))
+    return {
+        "dev_summary": result["dev_summary"],
+        "business_summary": result["business_summary"],
+        "files": result["files"].rows()
+    }
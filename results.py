@@ -0,0 +1,8 @@
+import os
+
+# Shared by the web app and the worker; imports nothing heavy so app.py can use it.
+# Jobs are enqueued with the same TTL so the job outlives its stored result.
+RESULT_TTL = int(os.getenv("RESULT_TTL", "3600"))
+
+def result_key(job_id: str) -> str:
+    return f"result:{job_id}"
@@ -1,8 +1,15 @@
 import os
 import ssl
+import logging
 from redis import Redis
 from rq import Worker, Queue
-from rq.connections import Connection
+
+# Import the task module once in the parent process so LangChain is loaded and
+# the graph compiled before RQ forks a work horse for each job.
+import tasks  # noqa: F401
+
+# Root logger at INFO so pr_graph's log lines (e.g. prompt cache hits) reach the worker logs.
+logging.basicConfig(level=logging.INFO)
 
 listen = ['default']
 redis_url = os.getenv('REDIS_URL')
@@ -13,6 +20,5 @@ conn = Redis.from_url(
 )
 
 if __name__ == '__main__':
-    with Connection(conn):
-        worker = Worker(map(Queue, listen))
-        worker.work()
+    worker = Worker([Queue(name, connection=conn) for name in listen], connection=conn)
+    worker.work()